@@ -11,6 +11,9 @@ THEME_OPTIONS = ("light", "dark")
 NUMBER_OF_CUSTOM_BUTTONS = 10 # The number of custom buttons allowed at 1 time
 MIN_WIDTH = 240 # The minimum width to hide the dummy window
 MIN_HEIGHT = 80 # The minimum height to hide the dummy window
+GEOMETRY_DELAY = 16 # Milliseconds between calls to the geometry bindings
+GEOMETRY_SETTLE_DELAY = 250 # Milliseconds without any geometry changes
+                            #   before the geometry counts as settled
 
 
 __author__ = "TheLizzard"
@@ -235,8 +238,7 @@ class FullScreenButton(tk.Button):
 
         geometry = f"{self.betterroot.root.winfo_width()}x"\
                    f"{self.betterroot.root.winfo_height()}"
-        for function in self.betterroot.geometry_bindings:
-            function(geometry)
+        self.betterroot.geometry_changed(geometry)
 
     def notfullscreen(self) -> None:
         """
@@ -318,6 +320,8 @@ class BetterTk(tk.Frame):
             __init__(master=None, settings:BetterTkSettings=DEFAULT_SETTINGS)
             protocol_generate(protocol:str) -> None
             topmost() -> None
+            geometry_changed(geometry:str) -> None
+            geometry_settled() -> None
             #custom_buttons#
 
         *List of methods that act the same was as tkinter.Tk's methods*
@@ -358,6 +362,17 @@ class BetterTk(tk.Frame):
             hide() => None
         buttons: # It is a list of all of the buttons
 
+    The geometry bindings:
+        geometry_bindings:
+            A list of functions that are called with the new geometry when
+            it changes. The calls are coalesced so that they happen at most
+            once every `GEOMETRY_DELAY` milliseconds with the latest
+            geometry.
+        geometry_settled_bindings:
+            A list of functions that are called with the geometry once the
+            user stops resizing/moving the window. Put the expensive work
+            (like rescaling images) in here.
+
     The custom_buttons:
         The proper way of using it is:
             ```
@@ -393,6 +408,11 @@ class BetterTk(tk.Frame):
         self.focused_widget = None
         self.is_full_screen = False
         self.geometry_bindings = []
+        self.geometry_settled_bindings = []
+        self._pending_geometry = ["", ""]
+        self._unsettled_geometry = ["", ""]
+        self._geometry_after_id = None
+        self._settle_after_id = None
 
         # Create the dummy window
         self.dummy_root = tk.Toplevel(self.root)
@@ -650,9 +670,68 @@ class BetterTk(tk.Frame):
             dummy_geometry = "+%i+%i" % (int(posx) + 75, int(posy) + 20)
         self.root.geometry(geometry)
         self.dummy_root.geometry(dummy_geometry)
+        self.geometry_changed(geometry)
+
+    def geometry_changed(self, geometry:str) -> None:
+        """
+        Schedules the calls to `geometry_bindings` and
+        `geometry_settled_bindings` for the new geometry.
+        """
+        size, position = self._split_geometry(geometry)
+        for geometries in (self._pending_geometry, self._unsettled_geometry):
+            if size != "":
+                geometries[0] = size
+            if position != "":
+                geometries[1] = position
+
+        if self._geometry_after_id is None:
+            self._geometry_after_id = self.root.after(GEOMETRY_DELAY,
+                                                      self._dispatch_geometry)
+        if self._settle_after_id is not None:
+            self.root.after_cancel(self._settle_after_id)
+        self._settle_after_id = self.root.after(GEOMETRY_SETTLE_DELAY,
+                                                self.geometry_settled)
+
+    def _split_geometry(self, geometry:str) -> (str, str):
+        # Splits "<width>x<height>+<x>+<y>" into the size and the position
+        if "+" in geometry:
+            idx = geometry.index("+")
+            return geometry[:idx], geometry[idx:]
+        return geometry, ""
+
+    def _dispatch_geometry(self) -> None:
+        self._geometry_after_id = None
+        geometry = "".join(self._pending_geometry)
+        self._pending_geometry = ["", ""]
+        if geometry == "":
+            return None
         for function in self.geometry_bindings:
             function(geometry)
 
+    def geometry_settled(self) -> None:
+        """
+        Calls `geometry_settled_bindings` with all of the geometry changes
+        since the last time it was called. It's called automatically
+        `GEOMETRY_SETTLE_DELAY` milliseconds after the last change or when
+        the user stops resizing the window.
+        """
+        if self._settle_after_id is not None:
+            self.root.after_cancel(self._settle_after_id)
+            self._settle_after_id = None
+        if self.resizable_window.started_resizing:
+            # `ResizableWindow.mouse_release` will call us
+            return None
+        if self._geometry_after_id is not None:
+            # Make sure that `geometry_bindings` see the change first
+            self.root.after_cancel(self._geometry_after_id)
+            self._dispatch_geometry()
+        geometry = "".join(self._unsettled_geometry)
+        self._unsettled_geometry = ["", ""]
+        if geometry == "":
+            return None
+        for function in self.geometry_settled_bindings:
+            function(geometry)
+
     def focus_force(self) -> None:
         self.root.deiconify()
         self.root.focus_force()
@@ -776,7 +855,9 @@ class ResizableWindow:
             self.geometry("%ix%i+%i+%i" % tuple(new_params))
 
     def mouse_release(self, event):
-        self.started_resizing = False
+        if self.started_resizing:
+            self.started_resizing = False
+            self.betterroot.geometry_settled()
 
     def mouse_press(self, event:tk.Event) -> None:
         if self.betterroot.is_full_screen:
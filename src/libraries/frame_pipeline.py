@@ -0,0 +1,274 @@
+from multiprocessing import shared_memory
+from PIL import Image
+import multiprocessing
+import numpy as np
+import queue
+import time
+import cv2
+
+
+# The states of a slot in the ring buffer. Only the child process moves a
+#   slot from FREE to READY and only the parent moves it back to FREE.
+FREE = 0
+READY = 1
+
+# The columns of the header of each slot
+FRAME_NUMBER = 0
+WIDTH = 1
+HEIGHT = 2
+STATE = 3
+
+# The entries of the status that the child process shares with the parent
+GENERATION = 0 # How many "goto" commands the child has handled
+POSITION = 1   # The number of the next frame that the child will decode
+CONTENT_BOX = slice(2, 6) # The box with everything that isn't a black bar
+
+# The same levels as `RESAMPLE_OPTIONS` in `player.py`
+INTERPOLATIONS = {0: cv2.INTER_NEAREST,
+                  1: cv2.INTER_AREA,
+                  2: cv2.INTER_LINEAR,
+                  3: cv2.INTER_LINEAR,
+                  4: cv2.INTER_CUBIC,
+                  5: cv2.INTER_LANCZOS4}
+
+
+def _content_box(image_matrix, limit:int) -> (int, int, int, int):
+    """
+    The same as `BasePlayer.get_content_box` in `player.py`.
+    """
+    content = image_matrix.max(axis=2) > limit
+    rows = np.flatnonzero(content.sum(axis=1) > content.shape[1] // 100)
+    columns = np.flatnonzero(content.sum(axis=0) > content.shape[0] // 100)
+    if (rows.size == 0) or (columns.size == 0):
+        return None
+    return (int(columns[0]), int(rows[0]),
+            int(columns[-1]) + 1, int(rows[-1]) + 1)
+
+
+def _worker(filename:str, shm_name:str, header, status, slots:int,
+            slot_size:int, crop_box:(int, int, int, int), size:(int, int),
+            resample_level:int, crop_check_every:int, crop_limit:int,
+            commands:multiprocessing.Queue) -> None:
+    """
+    Runs in the child process. It decodes, crops, converts and resizes the
+    frames and puts them in the free slots of the ring buffer. Every
+    `crop_check_every` frames it also grows the content box in `status`.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    header = np.frombuffer(header, dtype=np.int64).reshape(slots, 4)
+    status = np.frombuffer(status, dtype=np.int64)
+    cap = cv2.VideoCapture(filename)
+    frame_number = 0
+    frames_since_crop_check = 0
+    destination = None
+    running = True
+    while running:
+        while True:
+            try:
+                command, *args = commands.get_nowait()
+            except queue.Empty:
+                break
+            if command == "goto":
+                frame_number, generation = args
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+                status[POSITION] = frame_number
+                status[GENERATION] = generation
+            elif command == "size":
+                size, resample_level = args
+            elif command == "crop":
+                crop_box, = args
+            elif command == "stop":
+                running = False
+                break
+        if not running:
+            break
+
+        free_slots = np.flatnonzero(header[:, STATE] == FREE)
+        if free_slots.size == 0:
+            time.sleep(0.005)
+            continue
+
+        success, image_matrix = cap.read()
+        if not success:
+            # The end of the video
+            time.sleep(0.02)
+            continue
+        frames_since_crop_check += 1
+        if crop_check_every and (frames_since_crop_check >= crop_check_every):
+            frames_since_crop_check = 0
+            box = _content_box(image_matrix, crop_limit)
+            if box is not None:
+                content_box = status[CONTENT_BOX]
+                # Only grow it, so even a half written box is still correct
+                status[CONTENT_BOX] = (min(content_box[0], box[0]),
+                                       min(content_box[1], box[1]),
+                                       max(content_box[2], box[2]),
+                                       max(content_box[3], box[3]))
+        x1, y1, x2, y2 = crop_box
+        image_matrix = image_matrix[y1:y2, x1:x2]
+        image_matrix = cv2.cvtColor(image_matrix, cv2.COLOR_BGR2RGB)
+        if (x2 - x1, y2 - y1) != size:
+            interpolation = INTERPOLATIONS[resample_level]
+            image_matrix = cv2.resize(image_matrix, size,
+                                      interpolation=interpolation)
+        height, width, _ = image_matrix.shape
+
+        slot = free_slots[0]
+        if width * height * 3 <= slot_size:
+            destination = np.ndarray((height, width, 3), dtype=np.uint8,
+                                     buffer=shm.buf, offset=slot*slot_size)
+            destination[:] = image_matrix
+            header[slot, FRAME_NUMBER] = frame_number
+            header[slot, WIDTH] = width
+            header[slot, HEIGHT] = height
+            # Must be the last thing that we write
+            header[slot, STATE] = READY
+        frame_number += 1
+        status[POSITION] = frame_number
+
+    cap.release()
+    # Release our pointer to the shared memory before closing it
+    destination = None
+    shm.close()
+
+
+class FramePipeline:
+    """
+    Decodes a video in a child process. The finished frames are put in a
+    shared memory ring buffer and `get_frame` wraps them in `Image.Image`s
+    without copying them.
+
+    Usage:
+        pipeline = FramePipeline(filename, crop_box, size, max_pixels)
+        pipeline.goto(0)
+        image = pipeline.get_frame(0) # `None` if not decoded yet
+        pipeline.release_outside(lower, upper)
+        pipeline.close()
+    """
+    def __init__(self, filename:str, crop_box:(int, int, int, int),
+                 size:(int, int), max_pixels:int, slots:int=48,
+                 resample_level:int=4, crop_check_every:int=0,
+                 crop_limit:int=24):
+        """
+        `max_pixels` is the biggest `width*height` that a frame can have
+        (after resizing). Bigger frames are skipped. If `crop_check_every`
+        isn't 0, the child looks for content outside of the black bars
+        (pixels brighter than `crop_limit`) every that many frames.
+        """
+        self.slots = slots
+        self.slot_size = max_pixels * 3
+        self.shm = shared_memory.SharedMemory(create=True,
+                                              size=self.slot_size*slots)
+        context = multiprocessing.get_context("spawn")
+        self._header = context.RawArray("q", slots * 4)
+        self.header = np.frombuffer(self._header, dtype=np.int64)
+        self.header = self.header.reshape(slots, 4)
+        self._status = context.RawArray("q", 6)
+        self.status = np.frombuffer(self._status, dtype=np.int64)
+        self.status[CONTENT_BOX] = crop_box
+        self.commands = context.Queue()
+        self.generation = 0
+        self.first_frame = 0
+        self.last_image = None
+        self.last_slot = None
+
+        args = (filename, self.shm.name, self._header, self._status, slots,
+                self.slot_size, crop_box, size, resample_level,
+                crop_check_every, crop_limit, self.commands)
+        self.process = context.Process(target=_worker, args=args,
+                                       name="frame pipeline", daemon=True)
+        self.process.start()
+
+    def get_frame(self, frame_number:int) -> Image.Image:
+        slots = np.flatnonzero((self.header[:, STATE] == READY) &
+                               (self.header[:, FRAME_NUMBER] == frame_number))
+        if slots.size == 0:
+            return None
+        slot = slots[0]
+        if (slot == self.last_slot) and \
+           (self.last_image is not None) and \
+           (self.last_frame_number == frame_number):
+            # Return the same object so that it isn't converted again
+            return self.last_image
+        width = int(self.header[slot, WIDTH])
+        height = int(self.header[slot, HEIGHT])
+        start = slot * self.slot_size
+        data = self.shm.buf[start:start+width*height*3]
+        image = Image.frombuffer("RGB", (width, height), data, "raw", "RGB",
+                                 0, 1)
+        self.last_slot = slot
+        self.last_frame_number = frame_number
+        self.last_image = image
+        return image
+
+    def goto(self, frame_number:int) -> None:
+        """
+        Makes the child process start decoding from `frame_number` unless
+        it's already decoded or about to be.
+        """
+        if self.status[GENERATION] != self.generation:
+            # The child hasn't handled our last "goto" yet
+            if frame_number == self.first_frame:
+                return None
+        else:
+            # Where the child really is (it might have reached the end)
+            position = self.status[POSITION]
+            ready = self.header[:, STATE] == READY
+            if ready.any():
+                first_frame = self.header[ready, FRAME_NUMBER].min()
+            else:
+                first_frame = position
+            if first_frame <= frame_number <= position:
+                return None
+        self.restart(frame_number)
+
+    def restart(self, frame_number:int) -> None:
+        """
+        Drops all of the decoded frames and makes the child process start
+        decoding from `frame_number`.
+        """
+        self.generation += 1
+        self.first_frame = frame_number
+        self.commands.put(("goto", frame_number, self.generation))
+        self.header[:, STATE] = FREE
+        self.last_image = None
+
+    def set_size(self, size:(int, int), resample_level:int) -> None:
+        self.commands.put(("size", size, resample_level))
+
+    def set_crop(self, crop_box:(int, int, int, int),
+                 frame_number:int) -> None:
+        """
+        Changes the crop box and decodes again from `frame_number` so that
+        the frames with the old crop box aren't used.
+        """
+        self.commands.put(("crop", crop_box))
+        self.restart(frame_number)
+
+    def get_content_box(self) -> (int, int, int, int):
+        """
+        Returns the box (in the uncropped frames) that the child process
+        found content in. It only grows.
+        """
+        return tuple(map(int, self.status[CONTENT_BOX]))
+
+    def release_outside(self, lower:int, upper:int) -> None:
+        """
+        Frees all of the slots with frames that aren't in `[lower, upper)`.
+        """
+        frame_numbers = self.header[:, FRAME_NUMBER]
+        outside = (frame_numbers < lower) | (frame_numbers >= upper)
+        self.header[outside & (self.header[:, STATE] == READY), STATE] = FREE
+
+    def close(self) -> None:
+        self.last_image = None
+        self.commands.put(("stop", ))
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+        try:
+            self.shm.close()
+        except BufferError:
+            # Some `Image.Image`s still point to the shared memory
+            pass
+        self.shm.unlink()
@@ -6,13 +6,15 @@ TIME_TO_HIDE = 3 # Seconds
 PADX = 10        # Pixels
 PADY = 10        # Pixels
 THICKNESS = 10   # Pixels
+LOOP_COLOUR = "yellow"
+LOOP_MARKER_WIDTH = 2 # Pixels
 
 
 class ProgressBar:
     def __init__(self, canvas:tk.Canvas, _max:int, callback=None,
                  dragging_start_callback=None, dragging_end_callback=None,
                  hide_cursor:bool=True):
-        canvas.bind("<Configure>", None, add=True)
+        canvas.bind("<Configure>", self.configure, add=True)
         canvas.bind("<Motion>", self.motion, add=True)
         canvas.bind("<Leave>", self.leave, add=True)
         canvas.bind("<ButtonPress-1>", self.press, add=True)
@@ -30,6 +32,10 @@ class ProgressBar:
         self.dragging = False
         self.last_mouse_movement = 0
         self.hide_cursor = hide_cursor
+        self.update_after_id = None
+        self.drawn_x2 = None
+        self.loop_start = None
+        self.loop_end = None
 
         width = int(self.canvas.winfo_width())
         height = int(self.canvas.winfo_height())
@@ -97,43 +103,87 @@ class ProgressBar:
 
         x1, y1, x2, y2 = self.get_x1_y1_x2_y2()
         self.canvas.create_rectangle(x1, y1, x2, y2, fill="grey",
-                                     tags=("progressbar", ))
+                                     tags=("progressbar", "background"))
 
         self.canvas.create_rectangle(x1, y1, x1, y2, fill="white",
                                      tags=("progressbar", "past"))
 
         self.max_bar_width = x2 - x1
 
+    def configure(self, event:tk.Event) -> None:
+        if (event.width == self.width) and (event.height == self.height):
+            return None
+        self.width, self.height = event.width, event.height
+
+        x1, y1, x2, y2 = self.get_x1_y1_x2_y2()
+        self.canvas.coords("background", x1, y1, x2, y2)
+        self.max_bar_width = x2 - x1
+        self.draw_loop()
+        # Items created after us (like the video) would cover us
+        self.canvas.tag_raise("progressbar")
+        # Force the next `update_progressbar` to move the "past" rectangle
+        self.drawn_x2 = None
+        self.update_progressbar(keep_updating=False)
+
+    def set_loop(self, start:int=None, end:int=None) -> None:
+        """
+        Shows the A-B loop markers. Use `None` to remove a marker.
+        """
+        self.loop_start = start
+        self.loop_end = end
+        self.draw_loop()
+
+    def draw_loop(self) -> None:
+        self.canvas.delete("loop")
+        x1, y1, _, y2 = self.get_x1_y1_x2_y2()
+        state = "normal" if self.shown else "hidden"
+        xs = []
+        for value in (self.loop_start, self.loop_end):
+            if value is not None:
+                x = int(self.max_bar_width * (value / self.max) + x1)
+                xs.append(x)
+                self.canvas.create_rectangle(x, y1 - PADY//2,
+                                             x + LOOP_MARKER_WIDTH,
+                                             y2 + PADY//2, fill=LOOP_COLOUR,
+                                             outline="", state=state,
+                                             tags=("progressbar", "loop"))
+        if len(xs) == 2:
+            self.canvas.create_line(xs[0], y2, xs[1], y2, fill=LOOP_COLOUR,
+                                    width=LOOP_MARKER_WIDTH, state=state,
+                                    tags=("progressbar", "loop"))
+
     def update_progressbar(self, keep_updating=True) -> None:
+        if keep_updating:
+            self.update_after_id = None
         if perf_counter() - self.last_mouse_movement > TIME_TO_HIDE:
             self.hide()
         if not self.shown:
             return None
 
-        width = int(self.canvas.winfo_width())
-        height = int(self.canvas.winfo_height())
-        if (width != self.width) or (height != self.height):
-            self.canvas.delete("progressbar")
-            self.set_up(width, height)
-
         x1, y1, x2, y2 = self.get_x1_y1_x2_y2()
-        x2 = self.max_bar_width * (self.value / self.max) + x1
-        self.canvas.coords("past", x1, y1, x2, y2)
+        x2 = int(self.max_bar_width * (self.value / self.max) + x1)
+        if x2 != self.drawn_x2:
+            self.canvas.coords("past", x1, y1, x2, y2)
+            self.drawn_x2 = x2
 
         if keep_updating:
-            self.canvas.after(100, self.update_progressbar, True)
+            self.update_after_id = self.canvas.after(100,
+                                                     self.update_progressbar,
+                                                     True)
 
     def show(self, hide=True) -> None:
         if self.shown:
             return None
         self.shown = True
         self.canvas.itemconfigure("progressbar", state="normal")
+        self.canvas.tag_raise("progressbar")
         if hide:
             self.last_mouse_movement = perf_counter()
         else:
             # Never hide the progressbar
             self.last_mouse_movement = float("inf")
-        self.update_progressbar()
+        if self.update_after_id is None:
+            self.update_progressbar()
         if self.hide_cursor:
             self.canvas.config(cursor="")
 
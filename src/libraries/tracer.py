@@ -0,0 +1,84 @@
+from collections import deque
+from time import perf_counter
+import threading
+import json
+import os
+
+
+BUFFER_SIZE = 200000 # The maximum number of spans kept (the oldest are lost)
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer, name:str):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = perf_counter()
+
+    def __exit__(self, *args) -> None:
+        end = perf_counter()
+        # `deque.append` is thread safe so no need for a lock
+        self.tracer.events.append((self.name, threading.get_ident(),
+                                   self.start, end - self.start))
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """
+    Records spans of work per thread into a ring buffer and dumps them in
+    Chrome's trace event format (open it in "chrome://tracing" or
+    "https://ui.perfetto.dev").
+
+    Usage:
+        tracer = Tracer(enabled=True)
+        with tracer.span("decode"):
+            ...
+        tracer.dump("trace.json")
+    """
+    def __init__(self, enabled:bool=False, size:int=BUFFER_SIZE):
+        self.enabled = enabled
+        self.events = deque(maxlen=size)
+        self.start = perf_counter()
+
+    def span(self, name:str) -> _Span:
+        if self.enabled:
+            return _Span(self, name)
+        return NO_SPAN
+
+    def clear(self) -> None:
+        self.events.clear()
+
+    def dump(self, filename:str) -> None:
+        pid = os.getpid()
+        thread_names = {thread.ident: thread.name
+                        for thread in threading.enumerate()}
+        trace_events = []
+        tids = set()
+        for name, tid, start, duration in tuple(self.events):
+            tids.add(tid)
+            trace_events.append({"name": name, "ph": "X", "pid": pid,
+                                 "tid": tid,
+                                 "ts": (start - self.start) * 1e6,
+                                 "dur": duration * 1e6})
+        for tid in tids:
+            thread_name = thread_names.get(tid, str(tid))
+            trace_events.append({"name": "thread_name", "ph": "M",
+                                 "pid": pid, "tid": tid,
+                                 "args": {"name": thread_name}})
+        with open(filename, "w") as file:
+            json.dump({"traceEvents": trace_events}, file)
@@ -1,15 +1,20 @@
 from tkinter.filedialog import askopenfilename
 from PIL import Image, ImageTk
-from threading import Thread
+from threading import Thread, Lock
 from sys import stderr
+from io import BytesIO
 import tkinter as tk
+import numpy as np
 import tempfile
 import pygame
 import time
+import zlib
 import cv2
 import os
 
+from libraries.frame_pipeline import FramePipeline
 from libraries.progressbar import ProgressBar
+from libraries.tracer import Tracer
 
 
 def timeit(function, *args, number:int=100) -> float:
@@ -35,13 +40,32 @@ RESAMPLE_OPTIONS = {0: Image.NEAREST,
                     3: Image.HAMMING,
                     4: Image.BICUBIC,
                     5: Image.LANCZOS}
-RESAMPLE = RESAMPLE_OPTIONS[4]
+RESAMPLE_LEVEL = 4
+RESAMPLE = RESAMPLE_OPTIONS[RESAMPLE_LEVEL]
+
+# Change the resample filter depending on how far ahead the loader is.
+#   The quality goes down instead of stalling into the `TIME_PAUSED` pause.
+ADAPTIVE_RESAMPLE = True
+GOVERNOR_SLACK = 3         # Seconds of lead needed to raise the quality
+GOVERNOR_BEHIND = 1        # Seconds of lead under which it's lowered
+GOVERNOR_MAX_DROP_RATE = 0.05  # Fraction of frames that couldn't be shown
+GOVERNOR_HOLD = 2          # Seconds between two changes of the quality
 
 ABOVE = 31.1
 BELLOW = 15.1
-FRAMES_DELAY = 20
 
-pygame.init()
+# Frames close to the playhead are kept ready to be displayed (the hot
+#   tier). The rest are compressed (the warm tier) and decompressed when
+#   the playhead gets close to them.
+WARM_CACHE = True     # Only used if `PHOTOIMAGE_IN_MAIN`
+WARM_ABOVE = 90.1     # Seconds ahead that are cached (replaces `ABOVE`)
+HOT_ABOVE = 5         # Seconds ahead that are kept uncompressed
+HOT_BELLOW = 2        # Seconds behind that are kept uncompressed
+WARM_LOSSLESS = False # Use `zlib` instead of JPEG
+WARM_QUALITY = 90     # The JPEG quality
+FRAMES_DELAY = 20
+OVERLAY_DELAY = 100  # The status bar/progressbar are refreshed at most this
+                     #   often (in milliseconds)
 
 
 STATUS_BAR = True
@@ -51,11 +75,49 @@ ALLOWED_SLEEP = False
 DEBUGGING = True
 PHOTOIMAGE_IN_MAIN = True  # Very, very unstable if it's set to `False`
 PRE_PREPARED_SOUND = True
+# The extensions of the intermediate video files that `prepare_video.py`
+#   can make (look at `PROFILES` in there). The newest file is used.
+PRE_PREPARED_EXTENSIONS = (".ts", ".avi", ".mkv")
+
+AUTO_CROP = True               # Remove baked-in black bars before resizing
+AUTO_CROP_SAMPLES = 12         # Number of frames sampled to find the bars
+AUTO_CROP_LIMIT = 24           # Pixels with all channels <= this are "black"
+SCENE_CHANGE_THRESHOLD = 30    # Mean abs difference (0-255) of the thumbnails
+AUTO_CROP_CHECK_EVERY = 100    # Also re-check the bars every 100 frames (for
+                               #   subtitles that show up in the bars)
+THUMBNAIL_STEP = 8             # Every 8th pixel is used for the thumbnails
+
+DEDUP_FRAMES = True  # Consecutive frames that look the same share one image
+DEDUP_THRESHOLD = 8  # Max abs difference (0-255) between the thumbnail of a
+                     #   frame and the one of the frame that owns the shared
+                     #   image
+DEDUP_EXACT = True   # Only share if the full frames are the same. If False,
+                     #   only every `THUMBNAIL_STEP`th pixel is compared so
+                     #   small changes (like a cursor) can be missed
+
+OUT_OF_PROCESS = False # Decode/convert/resize in a child process and get the
+PIPELINE_SLOTS = 48    #   frames through a shared memory ring buffer with
+                       #   `PIPELINE_SLOTS` frames
+
+TRACING = False             # Record what each thread is doing. Press
+TRACE_FILE = "trace.json"   #   <Control-t> to save it to `TRACE_FILE` (in
+                            #   Chrome's trace event format)
 
 FRAMES_NOT_LOADED_THRESHOLD = 5 # If we can't load `FRAMES_NOT_LOADED_THRESHOLD`
                                 #   frames in a row pause for:
 TIME_PAUSED = 2000              #   `TIME_PAUSED` milliseconds
 
+PRELOAD_SECONDS = 5 # The next item in the playlist is opened this many
+                    #   seconds before the current one ends and this many
+                    #   seconds of it are decoded in advance
+SOUND_ENDED = pygame.USEREVENT + 1 # Posted by pygame when a sound ends
+
+MIN_LOOP_SECONDS = 0.5 # Shorter A-B loops are ignored
+MAX_LOOP_SECONDS = 60  # Longer A-B loops are cut (without the warm cache
+                       #   they can't be longer than `BELLOW` seconds)
+
+tracer = Tracer(enabled=TRACING)
+
 
 class StatusBar(tk.Frame):
     def __init__(self, master, **kwargs):
@@ -65,6 +127,8 @@ class StatusBar(tk.Frame):
         super().columnconfigure((1, 2, 3, 4), weight=1)
 
         self._fps = -1
+        self._time = None
+        self._frame_number = None
 
         self.frame_number_label = tk.Label(self, fg=fg, justify="left",
                                            **kwargs)
@@ -100,27 +164,34 @@ class StatusBar(tk.Frame):
     def loading(self, new_value:int) -> None:
         if self._loading == new_value:
             return None
-        self._loading = new_value % 20 + 1
+        self._loading = new_value
         if new_value == 0:
             text = ""
         else:
-            text = "Loading" + "." * self._loading
+            text = "Loading" + "." * (new_value % 20 + 1)
         self.loading_label.config(text=text)
 
     @property
-    def frame_number(self) -> None:
-        return None
+    def frame_number(self) -> int:
+        return self._frame_number
 
     @frame_number.setter
     def frame_number(self, new_value:int) -> None:
+        if self._frame_number == new_value:
+            return None
+        self._frame_number = new_value
         self.frame_number_label.config(text=f"Frame number: {new_value}")
 
     @property
-    def time(self) -> None:
-        return None
+    def time(self) -> int:
+        return self._time
 
     @time.setter
     def time(self, secs:int) -> None:
+        secs = int(secs)
+        if self._time == secs:
+            return None
+        self._time = secs
         mins, secs = divmod(int(secs), 60)
         hours, mins = divmod(mins, 60)
         mins = str(mins).zfill(2)
@@ -140,13 +211,142 @@ class StatusBar(tk.Frame):
             self.full_length = f"{mins}:{secs}"
         else:
             self.full_length = f"{hours}:{mins}:{secs}"
+        # Force the time label to be redrawn with the new length
+        self._time = None
+
+
+class ResampleGovernor:
+    """
+    Picks the resample filter (one of `RESAMPLE_OPTIONS`) based on the
+    loader's headroom: the decoded lead over the playhead, the fraction of
+    frames that couldn't be shown and how long resizing takes.
+    """
+    __slots__ = ("level", "last_change", "resize_time", "frames_shown",
+                 "frames_dropped")
+
+    def __init__(self, level:int=RESAMPLE_LEVEL):
+        self.level = level
+        self.last_change = time.perf_counter()
+        self.resize_time = 0
+        self.frames_shown = 0
+        self.frames_dropped = 0
+
+    @property
+    def resample(self) -> int:
+        if ADAPTIVE_RESAMPLE:
+            return RESAMPLE_OPTIONS[self.level]
+        return RESAMPLE
+
+    def add_resize_time(self, seconds:float) -> None:
+        # Exponential moving average so that it follows the current level
+        self.resize_time = 0.9 * self.resize_time + 0.1 * seconds
+
+    def add_frame(self, shown:bool) -> None:
+        if shown:
+            self.frames_shown += 1
+        else:
+            self.frames_dropped += 1
+
+    def update(self, lead:float, fps:float) -> None:
+        """
+        `lead` is the number of seconds ahead of the playhead that are
+        already decoded. The quality only changes once every
+        `GOVERNOR_HOLD` seconds and the gap between `GOVERNOR_BEHIND` and
+        `GOVERNOR_SLACK` stops it from flip-flopping.
+        """
+        total = self.frames_shown + self.frames_dropped
+        drop_rate = 0 if total == 0 else self.frames_dropped / total
+        self.frames_shown = self.frames_dropped = 0
+
+        now = time.perf_counter()
+        if now - self.last_change < GOVERNOR_HOLD:
+            return None
+
+        # The fraction of the loader's time that goes into resizing
+        resize_load = self.resize_time * fps
+        if (lead < GOVERNOR_BEHIND) or (drop_rate > GOVERNOR_MAX_DROP_RATE):
+            new_level = max(self.level - 1, min(RESAMPLE_OPTIONS))
+        elif (lead >= GOVERNOR_SLACK) and (drop_rate == 0) and \
+             (resize_load < 0.5):
+            new_level = min(self.level + 1, max(RESAMPLE_OPTIONS))
+        else:
+            return None
+        if new_level != self.level:
+            stderr.write(f"[Debug]: Resample level {self.level} => " \
+                         f"{new_level} (lead={lead:.1f}s, drop rate=" \
+                         f"{drop_rate:.2f}, resize load={resize_load:.2f})\n")
+            self.level = new_level
+            self.last_change = now
+
+
+class CompressedFrame:
+    """
+    A frame in the warm tier of the cache. Duplicate frames share the
+    same `CompressedFrame` so they also share the decompressed image.
+    A promoted frame keeps its `CompressedFrame` so that it's never
+    compressed again when it's demoted.
+    """
+    __slots__ = ("mode", "size", "data", "image")
+
+    def __init__(self, image:Image.Image):
+        self.mode = image.mode
+        self.size = image.size
+        self.image = None
+        if WARM_LOSSLESS:
+            self.data = zlib.compress(image.tobytes(), 1)
+        else:
+            buffer = BytesIO()
+            image.save(buffer, format="JPEG", quality=WARM_QUALITY)
+            self.data = buffer.getvalue()
+
+    def decompress(self) -> Image.Image:
+        if self.image is None:
+            if WARM_LOSSLESS:
+                data = zlib.decompress(self.data)
+                self.image = Image.frombytes(self.mode, self.size, data)
+            else:
+                image = Image.open(BytesIO(self.data))
+                image.load()
+                self.image = image
+        return self.image
+
+
+class PlaylistItem:
+    """
+    Everything that the player needs to play one video file. It's made by
+    `BasePlayer.open_item` and put into use by `BasePlayer.use_item`.
+    """
+    __slots__ = ("filename", "soundfile", "cap", "NUMBER_OF_FRAMES",
+                 "BASE_WIDTH", "BASE_HEIGHT", "FPS", "crop_box", "frames",
+                 "last_frame_loaded")
+
+    def __init__(self, filename:str, soundfile:str):
+        self.filename = filename
+        self.soundfile = soundfile
+        self.cap = cv2.VideoCapture(filename)
+        self.NUMBER_OF_FRAMES = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.BASE_WIDTH = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.BASE_HEIGHT = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.FPS = self.cap.get(cv2.CAP_PROP_FPS)
+        self.crop_box = (0, 0, self.BASE_WIDTH, self.BASE_HEIGHT)
+        self.frames = {}
+        self.last_frame_loaded = -1
 
 
 class BasePlayer(tk.Frame):
     __slots__ = ("width", "height", "cap", "NUMBER_OF_FRAMES",
-                 "BASE_WIDTH", "BASE_HEIGHT", "FPS", "sounddir", "proc")
+                 "BASE_WIDTH", "BASE_HEIGHT", "FPS", "sounddir", "proc",
+                 "crop_box", "crop_changed", "last_thumbnail",
+                 "thumbnail_difference", "requested_size", "shown_image",
+                 "frames_since_crop_check",
+                 "governor")
     def __init__(self, master, **kwargs):
+        # Not at import time because the child processes of the frame
+        #   pipeline import this module too
+        pygame.init()
         self.sounddir = None
+        self.shown_image = None
+        self.governor = ResampleGovernor()
 
         super().__init__(master, bd=0, highlightthickness=0)
         self.canvas = tk.Canvas(self, bd=0, highlightthickness=0, **kwargs)
@@ -161,35 +361,187 @@ class BasePlayer(tk.Frame):
         self.cap.release()
 
     def set_up(self, filename:str) -> None:
-        self.filename = filename
-        self.get_sound()
-
         self.resized = False
-        self.cap = cv2.VideoCapture(self.filename)
-        self.NUMBER_OF_FRAMES = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.BASE_WIDTH = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        self.BASE_HEIGHT = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        self.FPS = self.cap.get(cv2.CAP_PROP_FPS)
+        self.use_item(self.open_item(filename))
+        self.requested_size = (self.BASE_WIDTH, None)
 
         self.progressbar = ProgressBar(self.canvas, self.NUMBER_OF_FRAMES)
         if STATUS_BAR:
             self.status_bar.set_full_length(self.NUMBER_OF_FRAMES // self.FPS)
 
     def show_image(self, image:(Image.Image or ImageTk.PhotoImage)) -> None:
-        if PHOTOIMAGE_IN_MAIN:
-            image = ImageTk.PhotoImage(image, master=self)
-        self.tk_image = image
-        try:
-            self.canvas.itemconfig(self.image_id, image=self.tk_image)
-        except:
-            self.image_id = self.canvas.create_image(0, 0, anchor="nw",
-                                                     image=self.tk_image,
-                                                     tags=("image", ))
+        # Duplicate frames share the same image so there is nothing to do
+        if image is self.shown_image:
+            return None
+        self.shown_image = image
+        with tracer.span("present"):
+            if PHOTOIMAGE_IN_MAIN:
+                with tracer.span("convert"):
+                    image = ImageTk.PhotoImage(image, master=self)
+            self.tk_image = image
+            try:
+                self.canvas.itemconfig(self.image_id, image=self.tk_image)
+            except:
+                self.image_id = self.canvas.create_image(0, 0, anchor="nw",
+                                                         image=self.tk_image,
+                                                         tags=("image", ))
+
+    def open_item(self, filename:str) -> PlaylistItem:
+        """
+        Opens the video file (and its sound) and detects its black bars.
+        It doesn't change what the player is showing so it can be called
+        from another thread.
+        """
+        filename, soundfile = self.get_sound(filename)
+        item = PlaylistItem(filename, soundfile)
+        if AUTO_CROP:
+            self.detect_crop(item)
+        return item
+
+    def use_item(self, item:PlaylistItem) -> None:
+        """
+        Makes the player use the given `PlaylistItem`. It doesn't release
+        the previous one.
+        """
+        self.filename = item.filename
+        self.soundfile = item.soundfile
+        self.cap = item.cap
+        self.NUMBER_OF_FRAMES = item.NUMBER_OF_FRAMES
+        self.BASE_WIDTH = item.BASE_WIDTH
+        self.BASE_HEIGHT = item.BASE_HEIGHT
+        self.FPS = item.FPS
+        self.crop_box = item.crop_box
+        self.crop_changed = False
+        self.last_thumbnail = None
+        self.frames_since_crop_check = 0
+        self.thumbnail_difference = float("inf")
+
+    @property
+    def content_width(self) -> int:
+        return self.crop_box[2] - self.crop_box[0]
+
+    @property
+    def content_height(self) -> int:
+        return self.crop_box[3] - self.crop_box[1]
+
+    @staticmethod
+    def get_content_box(image_matrix) -> (int, int, int, int):
+        """
+        Returns the `(x1, y1, x2, y2)` box that contains everything that
+        isn't part of a black bar. A row/column counts as content if more
+        than 1% of its pixels are brighter than `AUTO_CROP_LIMIT`.
+        If the whole frame is black it returns `None`.
+        """
+        content = image_matrix.max(axis=2) > AUTO_CROP_LIMIT
+        rows = np.flatnonzero(content.sum(axis=1) > content.shape[1] // 100)
+        columns = np.flatnonzero(content.sum(axis=0) > content.shape[0] // 100)
+        if (rows.size == 0) or (columns.size == 0):
+            return None
+        return (int(columns[0]), int(rows[0]),
+                int(columns[-1]) + 1, int(rows[-1]) + 1)
+
+    @staticmethod
+    def join_boxes(box1:(int, int, int, int),
+                   box2:(int, int, int, int)) -> (int, int, int, int):
+        """
+        Returns the smallest box that contains both `box1` and `box2`.
+        """
+        return (min(box1[0], box2[0]), min(box1[1], box2[1]),
+                max(box1[2], box2[2]), max(box1[3], box2[3]))
+
+    def detect_crop(self, item:PlaylistItem) -> None:
+        """
+        Samples `AUTO_CROP_SAMPLES` frames spread over the video and sets
+        `item.crop_box` to the smallest box that contains the content of
+        all of them.
+        """
+        step = max(1, item.NUMBER_OF_FRAMES // (AUTO_CROP_SAMPLES + 1))
+        boxes = []
+        for frame_number in range(step, item.NUMBER_OF_FRAMES, step):
+            if len(boxes) == AUTO_CROP_SAMPLES:
+                break
+            item.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            success, image_matrix = item.cap.read()
+            if success:
+                box = self.get_content_box(image_matrix)
+                if box is not None:
+                    boxes.append(box)
+        item.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+        if len(boxes) == 0:
+            return None
+        crop_box = boxes.pop()
+        for box in boxes:
+            crop_box = self.join_boxes(crop_box, box)
+        item.crop_box = crop_box
+        stderr.write(f"[Debug]: Auto crop {item.crop_box} from " \
+                     f"{item.BASE_WIDTH}x{item.BASE_HEIGHT}\n")
+
+    def compare_thumbnail(self, image_matrix) -> None:
+        """
+        Compares a thumbnail of the matrix with the one of the previous
+        matrix that was read and sets `self.thumbnail_difference` to the
+        mean of the absolute difference.
+        """
+        thumbnail = image_matrix[::THUMBNAIL_STEP, ::THUMBNAIL_STEP]
+        thumbnail = thumbnail.astype(np.int16)
+        last_thumbnail, self.last_thumbnail = self.last_thumbnail, thumbnail
+        if (last_thumbnail is None) or \
+           (last_thumbnail.shape != thumbnail.shape):
+            self.thumbnail_difference = float("inf")
+        else:
+            difference = np.abs(thumbnail - last_thumbnail)
+            self.thumbnail_difference = difference.mean()
+
+    def check_crop(self, image_matrix) -> None:
+        """
+        Re-checks the black bars when the scene changes or every
+        `AUTO_CROP_CHECK_EVERY` frames. If content shows up outside of
+        `self.crop_box`, the box is grown and `self.crop_changed` is set so
+        that the main thread can re-apply the size.
+        """
+        self.frames_since_crop_check += 1
+        if (self.thumbnail_difference < SCENE_CHANGE_THRESHOLD) and \
+           (self.frames_since_crop_check < AUTO_CROP_CHECK_EVERY):
+            return None
+        self.frames_since_crop_check = 0
+        box = self.get_content_box(image_matrix)
+        if box is None:
+            return None
+        new_box = self.join_boxes(self.crop_box, box)
+        if new_box != self.crop_box:
+            self.crop_box = new_box
+            stderr.write(f"[Debug]: Auto crop grown to {self.crop_box}\n")
+            self.crop_changed = True
 
     def read_next_frame(self) -> Image.Image:
-        _, image_matrix = self.cap.read()
-        image_matrix = cv2.cvtColor(image_matrix, cv2.COLOR_RGB2BGR)
-        return Image.fromarray(image_matrix)
+        return self.matrix_to_image(self.read_next_matrix(), self.crop_box)
+
+    def read_next_matrix(self):
+        """
+        Reads the next frame without converting it. It also updates
+        `self.thumbnail_difference` and re-checks the black bars.
+        """
+        with tracer.span("decode"):
+            _, image_matrix = self.cap.read()
+        if image_matrix is not None:
+            self.compare_thumbnail(image_matrix)
+            if AUTO_CROP:
+                self.check_crop(image_matrix)
+        return image_matrix
+
+    @staticmethod
+    def matrix_to_image(image_matrix, crop_box:(int, int, int, int)):
+        """
+        Crops the matrix that `cv2` gave us to `crop_box` and converts it
+        into an `Image.Image`.
+        """
+        with tracer.span("convert"):
+            if AUTO_CROP and (image_matrix is not None):
+                x1, y1, x2, y2 = crop_box
+                image_matrix = image_matrix[y1:y2, x1:x2]
+            image_matrix = cv2.cvtColor(image_matrix, cv2.COLOR_RGB2BGR)
+            return Image.fromarray(image_matrix)
 
     def _resize(self, image:Image.Image) -> Image.Image:
         """
@@ -197,73 +549,98 @@ class BasePlayer(tk.Frame):
         `self.width` and `self.height`
         """
         if self.resized:
-            return image.resize((self.width, self.height), RESAMPLE)
+            start = time.perf_counter()
+            with tracer.span("resize"):
+                image = image.resize((self.width, self.height),
+                                     self.governor.resample)
+            self.governor.add_resize_time(time.perf_counter() - start)
+            return image
         else:
             return image
 
     def resize(self, width:int=None, height:int=None) -> None:
         """
         Resizes the video based on the width/height that is given.
-        It perseveres the aspect ratio.
+        It perseveres the aspect ratio of the cropped area.
+        """
+        self.requested_size = (width, height)
+        self.width, self.height = self.fit_size(self.content_width,
+                                                self.content_height,
+                                                width, height)
+
+        self.canvas.config(width=self.width, height=self.height)
+        self.resized = not (self.width == self.content_width)
+        stderr.write(f"[Debug]: Resize {self.width}x{self.height}  \t"\
+                     f"resized={self.resized}\n")
+
+    @staticmethod
+    def fit_size(content_width:int, content_height:int, width:int=None,
+                 height:int=None) -> (int, int):
+        """
+        Returns the biggest size that fits in `width`x`height` and has the
+        same aspect ratio as `content_width`x`content_height`.
         """
         if width is None:
             xfactor = float("inf")
         else:
             assert isinstance(width, int), "The `width` must be an `int`."
-            xfactor = width/self.BASE_WIDTH
+            xfactor = width/content_width
 
         if height is None:
             yfactor = float("inf")
         else:
             assert isinstance(height, int), "The `height` must be an `int`."
-            yfactor = height/self.BASE_HEIGHT
+            yfactor = height/content_height
 
         factor = min(xfactor, yfactor)
-        self.width = int(factor * self.BASE_WIDTH)
-        self.height = int(factor * self.BASE_HEIGHT)
-
-        self.canvas.config(width=self.width, height=self.height)
-        self.resized = not (self.width == self.BASE_WIDTH)
-        stderr.write(f"[Debug]: Resize {self.width}x{self.height}  \t"\
-                     f"resized={self.resized}\n")
+        return int(factor * content_width), int(factor * content_height)
 
     def goto_frame_number(self, frame_number:int) -> None:
         """
         Goes to the frame number specified.
         """
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        with tracer.span("seek"):
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
 
-    def get_sound(self) -> None:
+    def get_sound(self, filename:str) -> (str, str):
         """
-        Saves the sound from the file given in another file. The filename
-        for the sound file is:
+        Saves the sound from the file given in another file. Returns the
+        filename of the video that should be read (it can be a pre-prepared
+        one) and the filename for the sound file which is:
 
             if PRE_PREPARED_SOUND or DEBUGGING:
-                f"tmp/{self.filename}_sound.mp3"
+                f"tmp/{filename}_sound.mp3"
             else:
-                <BasePlayer>.sounddir.name + "/sound.mp3"
+                <BasePlayer>.sounddir.name + f"/{filename}_sound.mp3"
         """
+        name = filename.replace("\\", "/").split("/")[-1]
         if PRE_PREPARED_SOUND or DEBUGGING:
-            self.soundfile = self.filename.replace("\\", "/").split("/")[-1]
-            self.soundfile = f"tmp/{self.soundfile}_sound.mp3"
+            soundfile = f"tmp/{name}_sound.mp3"
             stderr.write("[Debug]: Using this sound file: " \
-                         f"\"{self.soundfile}\"\n")
-            assert os.path.isfile(self.soundfile), "Not pre-prepared"
+                         f"\"{soundfile}\"\n")
+            assert os.path.isfile(soundfile), "Not pre-prepared"
 
             if PRE_PREPARED_SOUND:
-                higher_quality = self.filename.replace("\\", "/").split("/")[-1]
-                higher_quality = f"tmp/{higher_quality}_video.ts"
-                if os.path.isfile(higher_quality):
-                    self.filename = higher_quality
-
-            return None
-
-        self.sounddir = tempfile.TemporaryDirectory()
-        self.soundfile = self.sounddir.name + "/sound.mp3"
-
-        command = f"ffmpeg -i {self.filename} -vcodec mpeg1video -acodec " \
-                  f"libmp3lame -intra {self.soundfile}"
+                # Use the profile that was prepared last
+                newest = None
+                for extension in PRE_PREPARED_EXTENSIONS:
+                    higher_quality = f"tmp/{name}_video{extension}"
+                    if os.path.isfile(higher_quality):
+                        modified = os.path.getmtime(higher_quality)
+                        if (newest is None) or (modified > newest):
+                            newest = modified
+                            filename = higher_quality
+
+            return filename, soundfile
+
+        if self.sounddir is None:
+            self.sounddir = tempfile.TemporaryDirectory()
+        soundfile = f"{self.sounddir.name}/{name}_sound.mp3"
+
+        command = f"ffmpeg -i {filename} -vcodec mpeg1video -acodec " \
+                  f"libmp3lame -intra {soundfile}"
         os.system(command)
+        return filename, soundfile
 
     def close_sounddir(self) -> None:
         """
@@ -281,6 +658,24 @@ class BasePlayer(tk.Frame):
         pygame.mixer.music.load(self.soundfile)
         pygame.mixer.music.play()
 
+    def queue_sound(self, soundfile:str) -> None:
+        """
+        Opens `soundfile` now and starts playing it as soon as the current
+        sound ends.
+        """
+        pygame.event.clear(SOUND_ENDED)
+        pygame.mixer.music.set_endevent(SOUND_ENDED)
+        pygame.mixer.music.queue(soundfile)
+
+    def queued_sound_started(self) -> bool:
+        """
+        Checks if the sound from `queue_sound` started playing (pygame
+        posts `SOUND_ENDED` when it switches to it).
+        """
+        started = pygame.event.peek(SOUND_ENDED)
+        pygame.event.clear(SOUND_ENDED)
+        return started
+
     def pause_sound(self) -> None:
         pygame.mixer.music.pause()
 
@@ -288,9 +683,10 @@ class BasePlayer(tk.Frame):
         pygame.mixer.music.unpause()
 
     def sound_goto(self, time:float) -> None:
-        pygame.mixer.music.rewind()
-        if 0 < time < self.NUMBER_OF_FRAMES / self.FPS:
-            pygame.mixer.music.set_pos(time)
+        with tracer.span("sound_goto"):
+            pygame.mixer.music.rewind()
+            if 0 < time < self.NUMBER_OF_FRAMES / self.FPS:
+                pygame.mixer.music.set_pos(time)
 
     def stop_sound(self) -> None:
         pygame.mixer.music.stop()
@@ -299,30 +695,359 @@ class BasePlayer(tk.Frame):
 
 class Player(BasePlayer):
     __slots__ = ("frames", "time_paused", "base_timer", "playing",
-                 "frame_number_shown", "loading_frames", "last_frame_loaded")
+                 "frame_number_shown", "loading_frames", "last_frame_loaded",
+                 "fps", "playlist", "next_item", "preloading", "cap_lock",
+                 "sound_queued",
+                 "frames_deduplicated", "dedup_thumbnail", "dedup_matrix",
+                 "warm_frames", "pipeline", "loop_start", "loop_end")
 
     def __init__(self, master, **kwargs):
         super().__init__(master, **kwargs)
+        self.pipeline = None
+        self.loop_start = None
+        self.loop_end = None
         self.clear_frames_cache()
         self.frame_number_shown = 0
         self.last_frame_loaded = -1
+        self.frames_deduplicated = 0
+        self.playlist = []
+        self.next_item = None
+        self.preloading = False
+        self.sound_queued = False
+        self.cap_lock = Lock()
         super().focus()
         super().bind("<space>", self.toggle_pause, add=True)
         super().bind("<Left>", self.left_pressed, add=True)
         super().bind("<Right>", self.right_pressed, add=True)
         super().bind("<Control-r>", self.clear_frames_cache, add=True)
+        super().bind("<Control-t>", self.dump_trace, add=True)
+        super().bind("<KeyPress-a>", self.set_loop_start, add=True)
+        super().bind("<KeyPress-b>", self.set_loop_end, add=True)
+        super().bind("<KeyPress-c>", self.clear_loop, add=True)
 
         self.last_5_fps = [0, 0, 0, 0, 0]
+        self.fps = 0
         self.temp_pause_after_id = None
 
         self.frames_coundnt_load = 0
 
     def clear_frames_cache(self, event:tk.Event=None) -> None:
         self.frames = {}
+        self.warm_frames = {}
+        self.clear_dedup()
         self.change_frame_shown()
 
+    @property
+    def use_warm_cache(self) -> bool:
+        # We can't compress `ImageTk.PhotoImage`s
+        return WARM_CACHE and PHOTOIMAGE_IN_MAIN
+
+    @property
+    def cache_above(self) -> float:
+        if self.use_warm_cache:
+            return WARM_ABOVE
+        return ABOVE
+
+    def in_cache(self, frame_number:int) -> bool:
+        return (frame_number in self.frames) or \
+               (frame_number in self.warm_frames)
+
+    def get_frame(self, frame_number:int) -> Image.Image:
+        """
+        Returns the frame from the cache or `None` if it isn't loaded.
+        If the frame is only in the warm tier, it's promoted to the hot
+        tier.
+        """
+        image = self.frames.get(frame_number, None)
+        if (image is None) and (self.pipeline is not None):
+            return self.pipeline.get_frame(frame_number)
+        if image is None:
+            compressed = self.warm_frames.get(frame_number, None)
+            if compressed is not None:
+                image = self.promote_frame(frame_number, compressed)
+        return image
+
+    def promote_frame(self, frame_number:int,
+                      compressed:CompressedFrame) -> Image.Image:
+        with tracer.span("promote"):
+            image = compressed.decompress()
+        # Keep it in the warm tier too so that it isn't compressed again
+        self.frames[frame_number] = image
+        return image
+
+    def promote_loop(self) -> None:
+        while self.loading_frames:
+            self._promote_loop()
+            time.sleep(FRAMES_DELAY/1000)
+
+    def _promote_loop(self) -> None:
+        """
+        Decompresses the frames that are less than `HOT_ABOVE` seconds
+        ahead of the playhead.
+        """
+        start = self.frame_number_shown
+        end = min(self.NUMBER_OF_FRAMES, start + int(HOT_ABOVE * self.FPS))
+        frame_numbers = range(start, end)
+        loop_wrap_range = self.loop_wrap_range()
+        if loop_wrap_range is not None:
+            # Also the frames that are shown after the A-B loop jumps back
+            frame_numbers = list(range(start, end)) + \
+                            list(range(*loop_wrap_range))
+        for frame_number in frame_numbers:
+            if start != self.frame_number_shown:
+                # The playhead moved, so start again
+                return None
+            if frame_number in self.frames:
+                continue
+            compressed = self.warm_frames.get(frame_number, None)
+            if compressed is not None:
+                self.promote_frame(frame_number, compressed)
+
     def change_frame_shown(self) -> None:
         self.changed_frame_shown = dict(main=True)
+        if self.pipeline is not None:
+            self.pipeline.goto(self.frame_number_shown)
+
+    @property
+    def loop_region(self) -> (int, int):
+        """
+        The A-B loop as `(first_frame, last_frame)` or `None` if not set.
+        """
+        if (self.loop_start is None) or (self.loop_end is None):
+            return None
+        return self.loop_start, self.loop_end
+
+    @property
+    def max_loop_frames(self) -> int:
+        if self.use_warm_cache:
+            # The pinned frames are kept compressed
+            return int(MAX_LOOP_SECONDS * self.FPS)
+        # The frames are uncompressed so only pin the ones that the cleanup
+        #   would keep anyway while the playhead is at the end of the loop
+        return int(min(MAX_LOOP_SECONDS, BELLOW) * self.FPS)
+
+    def is_pinned(self, frame_number:int) -> bool:
+        """
+        Frames inside the A-B loop are never evicted from the cache. Once
+        A is set, the frames after it are kept until B is set.
+        """
+        if self.loop_start is None:
+            return False
+        if self.loop_end is None:
+            loop_end = self.loop_start + self.max_loop_frames - 1
+        else:
+            loop_end = self.loop_end
+        return self.loop_start <= frame_number <= loop_end
+
+    def current_loop(self) -> (int, int):
+        """
+        Returns the A-B loop if the playhead is inside of it, otherwise
+        returns `None`.
+        """
+        loop_region = self.loop_region
+        if loop_region is None:
+            return None
+        if loop_region[0] <= self.frame_number_shown <= loop_region[1]:
+            return loop_region
+        return None
+
+    def loop_wrap_range(self) -> (int, int):
+        """
+        If the A-B loop will jump back in less than `HOT_ABOVE` seconds,
+        returns the `[start, end)` frames that will be shown after the
+        jump. Otherwise returns `None`.
+        """
+        loop_region = self.current_loop()
+        if loop_region is None:
+            return None
+        loop_start, loop_end = loop_region
+        hot_upper = self.frame_number_shown + int(HOT_ABOVE * self.FPS)
+        if hot_upper <= loop_end:
+            return None
+        return loop_start, min(loop_end + 1, loop_start + hot_upper - loop_end)
+
+    def set_loop_start(self, event:tk.Event=None) -> None:
+        self.loop_start = self.frame_number_shown
+        self._update_loop()
+
+    def set_loop_end(self, event:tk.Event=None) -> None:
+        self.loop_end = self.frame_number_shown
+        self._update_loop()
+
+    def clear_loop(self, event:tk.Event=None) -> None:
+        self.loop_start = self.loop_end = None
+        self._update_loop()
+
+    def _update_loop(self) -> None:
+        if self.loop_region is not None:
+            if self.loop_start > self.loop_end:
+                self.loop_start, self.loop_end = self.loop_end, self.loop_start
+            length = self.loop_end + 1 - self.loop_start
+            if length < MIN_LOOP_SECONDS * self.FPS:
+                stderr.write("[Debug]: The A-B loop is too short\n")
+                self.loop_end = None
+            elif length > self.max_loop_frames:
+                stderr.write("[Debug]: The A-B loop is too long so it " \
+                             "was cut\n")
+                self.loop_end = self.loop_start + self.max_loop_frames - 1
+        if self.loop_region is not None:
+            stderr.write(f"[Debug]: Looping {self.loop_region}\n")
+            # Make the loader fill the whole loop
+            self.change_frame_shown()
+        self.progressbar.set_loop(self.loop_start, self.loop_end)
+
+    def loop_back(self, now:float) -> float:
+        """
+        Jumps from the end of the A-B loop back to its start and returns
+        the new time delta.
+        """
+        loop_start, loop_end = self.loop_region
+        self.base_timer += (loop_end + 1 - loop_start) / self.FPS
+        time_delta = now - self.base_timer
+        self.frame_number_shown = max(0, int(time_delta * self.FPS))
+        super().sound_goto(time_delta)
+        # Tell the loader (and the child process) that we jumped back
+        self.change_frame_shown()
+        return time_delta
+
+    def start_pipeline(self, first_frame:int=0) -> None:
+        """
+        Starts decoding the current item in a child process (look at
+        `OUT_OF_PROCESS`).
+        """
+        if self.resized:
+            size = (self.width, self.height)
+        else:
+            size = (self.content_width, self.content_height)
+        screen_pixels = self.winfo_screenwidth() * self.winfo_screenheight()
+        max_pixels = max(self.content_width*self.content_height,
+                         screen_pixels)
+        crop_check_every = AUTO_CROP_CHECK_EVERY if AUTO_CROP else 0
+        self.pipeline = FramePipeline(self.filename, self.crop_box, size,
+                                      max_pixels, slots=PIPELINE_SLOTS,
+                                      resample_level=self.governor.level,
+                                      crop_check_every=crop_check_every,
+                                      crop_limit=AUTO_CROP_LIMIT)
+        self.pipeline.goto(first_frame)
+
+    def check_pipeline_crop(self) -> None:
+        """
+        The same as `check_crop` but uses the content box that the child
+        process of the frame pipeline found.
+        """
+        new_box = self.join_boxes(self.crop_box,
+                                  self.pipeline.get_content_box())
+        if new_box != self.crop_box:
+            self.crop_box = new_box
+            stderr.write(f"[Debug]: Auto crop grown to {self.crop_box}\n")
+            self.crop_changed = True
+
+    def stop_pipeline(self) -> None:
+        if self.pipeline is not None:
+            self.pipeline.close()
+            self.pipeline = None
+
+    def resize(self, width:int=None, height:int=None) -> None:
+        super().resize(width, height)
+        if self.pipeline is not None:
+            self.pipeline.set_size((self.width, self.height),
+                                   self.governor.level)
+
+    def use_item(self, item:PlaylistItem) -> None:
+        super().use_item(item)
+        self.frames = item.frames
+        self.warm_frames = {}
+        self.clear_dedup()
+        self.last_frame_loaded = item.last_frame_loaded
+        self.change_frame_shown()
+
+    def queue(self, filename:str) -> None:
+        """
+        Adds the file to the end of the playlist.
+        """
+        self.playlist.append(filename)
+
+    def check_preload(self) -> None:
+        """
+        Starts opening the next item in the playlist if the current one
+        is about to end and queues its sound once it's ready.
+        """
+        if (self.next_item is not None) and (not self.sound_queued):
+            super().queue_sound(self.next_item.soundfile)
+            self.sound_queued = True
+        if self.preloading or (self.next_item is not None):
+            return None
+        if len(self.playlist) == 0:
+            return None
+        frames_left = self.NUMBER_OF_FRAMES - self.frame_number_shown
+        if frames_left > PRELOAD_SECONDS * self.FPS:
+            return None
+        self.preloading = True
+        thread = Thread(target=self.preload_next_item, name="preloader",
+                        args=(self.playlist.pop(0), ), daemon=True)
+        thread.start()
+
+    def preload_next_item(self, filename:str) -> None:
+        """
+        Opens `filename` and decodes its first `PRELOAD_SECONDS` seconds
+        into its own cache. It's called from another thread.
+        """
+        stderr.write(f"[Debug]: Preloading \"{filename}\"\n")
+        item = None
+        try:
+            item = super().open_item(filename)
+            if (item.FPS <= 0) or (item.NUMBER_OF_FRAMES <= 0):
+                raise ValueError("Can't read the number of frames/FPS")
+            x1, y1, x2, y2 = item.crop_box
+            size = super().fit_size(x2 - x1, y2 - y1, *self.requested_size)
+            for frame_number in range(int(PRELOAD_SECONDS * item.FPS)):
+                if not self.loading_frames:
+                    break
+                with tracer.span("decode"):
+                    success, image_matrix = item.cap.read()
+                if not success:
+                    break
+                image = super().matrix_to_image(image_matrix, item.crop_box)
+                if image.size != size:
+                    image = image.resize(size, self.governor.resample)
+                if not PHOTOIMAGE_IN_MAIN:
+                    image = self.convert_image_to_tk(image)
+                item.frames[frame_number] = image
+                item.last_frame_loaded = frame_number
+            self.next_item = item
+        except Exception as error:
+            # `check_preload` will move on to the next file in the playlist
+            stderr.write(f"[Debug]: Skipping \"{filename}\" because it " \
+                         f"couldn't be opened: {error!r}\n")
+            if item is not None:
+                item.cap.release()
+        finally:
+            self.preloading = False
+
+    def play_next_item(self) -> None:
+        """
+        Switches to the preloaded item and releases the current one.
+        """
+        # The new item starts exactly where the old one ended
+        self.base_timer += self.NUMBER_OF_FRAMES / self.FPS
+        self.stop_pipeline()
+        with self.cap_lock:
+            self.cap.release()
+            self.use_item(self.next_item)
+            self.next_item = None
+        self.clear_loop()
+        stderr.write(f"[Debug]: Playing \"{self.filename}\"\n")
+        super().resize(*self.requested_size)
+        if OUT_OF_PROCESS:
+            self.start_pipeline(self.last_frame_loaded + 1)
+        if (not self.sound_queued) or (not super().queued_sound_started()):
+            # The old sound is longer than the old video so pygame is still
+            #   playing it. Start the new sound ourselves.
+            super().play_sound()
+        self.sound_queued = False
+        self.progressbar.max = self.NUMBER_OF_FRAMES
+        if STATUS_BAR:
+            self.status_bar.set_full_length(self.NUMBER_OF_FRAMES // self.FPS)
 
     def left_pressed(self, event:tk.Event=None) -> None:
         now = time.perf_counter()
@@ -333,11 +1058,7 @@ class Player(BasePlayer):
         self.change_frame_shown()
         self.start_pause_time = now
         self.progressbar.last_mouse_movement = now
-        self.progressbar.value = self.frame_number_shown
-        if STATUS_BAR:
-            if STATUS_BAR_FRAME_NUMBER:
-                self.status_bar.frame_number = self.frame_number_shown
-            self.status_bar.time = self.frame_number_shown // self.FPS
+        self.refresh_overlay()
         self._show_frame_when_paused(self.frame_number_shown)
         stderr.write(f"[Debug]: Calling goto {self.frame_number_shown}\n")
 
@@ -354,11 +1075,7 @@ class Player(BasePlayer):
         self.change_frame_shown()
         self.start_pause_time = now
         self.progressbar.last_mouse_movement = now
-        self.progressbar.value = self.frame_number_shown
-        if STATUS_BAR:
-            if STATUS_BAR_FRAME_NUMBER:
-                self.status_bar.frame_number = self.frame_number_shown
-            self.status_bar.time = self.frame_number_shown // self.FPS
+        self.refresh_overlay()
         self._show_frame_when_paused(self.frame_number_shown)
         stderr.write(f"[Debug]: Calling goto {self.frame_number_shown}\n")
 
@@ -366,10 +1083,7 @@ class Player(BasePlayer):
         self.frame_number_shown = frame_number
         self.change_frame_shown()
         self.base_timer = time.perf_counter() - frame_number / self.FPS
-        if STATUS_BAR:
-            if STATUS_BAR_FRAME_NUMBER:
-                self.status_bar.frame_number = frame_number
-            self.status_bar.time = self.frame_number_shown // self.FPS
+        self.refresh_overlay()
         self._show_frame_when_paused(frame_number)
         stderr.write(f"[Debug]: Calling goto {self.frame_number_shown}\n")
 
@@ -379,8 +1093,9 @@ class Player(BasePlayer):
             self.temp_pause_after_id = None
         if self.playing:
             return None
-        if frame_number in self.frames:
-            super().show_image(self.frames[self.frame_number_shown])
+        image = self.get_frame(frame_number)
+        if image is not None:
+            super().show_image(image)
         else:
             f = self._show_frame_when_paused
             self.temp_pause_after_id = super().after(100, f, frame_number)
@@ -392,10 +1107,17 @@ class Player(BasePlayer):
         self.progressbar.dragging_start_callback = self.temp_pause
         self.progressbar.dragging_end_callback = self.temp_unpause
         self.loading_frames = True
-        thread = Thread(target=self.load_frames, daemon=True)
+        if OUT_OF_PROCESS:
+            self.start_pipeline()
+            return None
+        thread = Thread(target=self.load_frames, name="loader", daemon=True)
         thread.start()
-        thread = Thread(target=self.cleanup_loop, daemon=True)
+        thread = Thread(target=self.cleanup_loop, name="cleanup", daemon=True)
         thread.start()
+        if self.use_warm_cache:
+            thread = Thread(target=self.promote_loop, name="promoter",
+                            daemon=True)
+            thread.start()
 
     def temp_pause(self) -> None:
         self._playing = self.playing
@@ -414,6 +1136,7 @@ class Player(BasePlayer):
         self.base_timer = time.perf_counter()
         self.last_updated = self.base_timer
         self.display_loop()
+        self.overlay_loop()
         super().play_sound()
 
     def toggle_pause(self, event:tk.Event=None) -> None:
@@ -445,26 +1168,61 @@ class Player(BasePlayer):
         if not self.playing:
             return None
 
+        if (self.pipeline is not None) and AUTO_CROP:
+            self.check_pipeline_crop()
+        if self.crop_changed:
+            # The loader found content outside of the black bars
+            self.crop_changed = False
+            self.resize(*self.requested_size)
+            if self.pipeline is not None:
+                self.pipeline.set_crop(self.crop_box, self.frame_number_shown)
+            self.clear_frames_cache()
+
         now = time.perf_counter()
         time_delta = now - self.base_timer
 
+        last_frame_shown = self.frame_number_shown
         self.frame_number_shown = max(0, int(time_delta * self.FPS))
+        loop_region = self.loop_region
+        if (loop_region is not None) and \
+           (last_frame_shown <= loop_region[1] < self.frame_number_shown):
+            time_delta = self.loop_back(now)
         if self.frame_number_shown > self.NUMBER_OF_FRAMES:
-            return None
-        self.progressbar.value = self.frame_number_shown
+            if self.next_item is None:
+                # Start the next file if the last preload failed
+                self.check_preload()
+                if self.preloading:
+                    # Wait for the next item in the playlist
+                    super().after(FRAMES_DELAY, self.display_loop,
+                                  update_number)
+                return None
+            self.play_next_item()
+            time_delta = now - self.base_timer
+            self.frame_number_shown = max(0, int(time_delta * self.FPS))
+        self.check_preload()
 
         if (update_number - 20) % 500 == 0:
             super().sound_goto(time_delta)
 
-        if self.frame_number_shown in self.frames:
-            super().show_image(self.frames[self.frame_number_shown])
+        if self.pipeline is not None:
+            # Let the child process reuse the slots of the old frames
+            self.pipeline.release_outside(self.frame_number_shown,
+                                          self.frame_number_shown + \
+                                          2*PIPELINE_SLOTS)
+        elif ADAPTIVE_RESAMPLE and (update_number % 25 == 0):
+            self.governor.update(self.get_lead(), self.FPS)
+
+        image = self.get_frame(self.frame_number_shown)
+        self.governor.add_frame(shown=image is not None)
+        if image is not None:
+            super().show_image(image)
             self.frames_coundnt_load = 0
             if STATUS_BAR:
                 global ABOVE
                 self.last_5_fps.append(int(1/(now - self.last_updated) + 0.5))
                 self.last_5_fps.pop(0)
                 fps = int(sum(self.last_5_fps) / 5)
-                self.status_bar.fps = fps
+                self.fps = fps
                 self.last_updated = now
                 # If the FPS is high enough we can afford to increase `ABOVE`
                 if fps > 25:
@@ -472,7 +1230,6 @@ class Player(BasePlayer):
                     # Also make sure it can't go lower than the default `ABOVE`
                     #   from the min
                     ABOVE = max(ABOVE, min(ABOVE+1, 31))
-                self.status_bar.loading = 0
         else:
             #stderr.write("[Debug]: Needing frame number " \
             #             f"{self.frame_number_shown}\n")
@@ -481,31 +1238,113 @@ class Player(BasePlayer):
                 self.pause()
                 stderr.write("[Debug]: Paused because can't show frames\n")
                 super().after(TIME_PAUSED, self.unpause)
-            if STATUS_BAR:
-                self.status_bar.loading += 1
 
+        super().after(FRAMES_DELAY, self.display_loop, (update_number+1)%1000)
+
+    def get_lead(self) -> float:
+        """
+        Returns how many seconds after the playhead are loaded without a
+        gap (up to `GOVERNOR_SLACK` seconds).
+        """
+        end = self.frame_number_shown + int(GOVERNOR_SLACK * self.FPS)
+        end = min(self.NUMBER_OF_FRAMES, end)
+        for frame_number in range(self.frame_number_shown, end):
+            if not self.in_cache(frame_number):
+                return (frame_number - self.frame_number_shown) / self.FPS
+        return GOVERNOR_SLACK
+
+    def overlay_loop(self) -> None:
+        if not self.loading_frames:
+            return None
+        self.refresh_overlay()
+        super().after(OVERLAY_DELAY, self.overlay_loop)
+
+    def refresh_overlay(self) -> None:
+        """
+        Pushes the current state to the status bar and the progressbar.
+        The widgets only redraw themselves when what they show changes.
+        """
+        self.progressbar.value = self.frame_number_shown
+        self.progressbar.update_progressbar(keep_updating=False)
         if STATUS_BAR:
             if STATUS_BAR_FRAME_NUMBER:
                 self.status_bar.frame_number = self.frame_number_shown
             self.status_bar.time = self.frame_number_shown // self.FPS
-        super().after(FRAMES_DELAY, self.display_loop, (update_number+1)%1000)
+            self.status_bar.fps = self.fps
+            self.status_bar.loading = self.frames_coundnt_load
 
     def cleanup_loop(self) -> None:
         time.sleep(1)
         while self.loading_frames:
-            self._cleanup_loop()
+            with tracer.span("evict"):
+                self._cleanup_loop()
+            time.sleep(2)
 
     def _cleanup_loop(self) -> None:
         current_frame_number = self.frame_number_shown
         lower = current_frame_number - int(BELLOW * self.FPS)
-        upper = current_frame_number + int(ABOVE * self.FPS)
+        upper = current_frame_number + int(self.cache_above * self.FPS)
         upper = min(self.NUMBER_OF_FRAMES, upper)
-        for frame_number in tuple(self.frames.keys()):
+        hot_lower = current_frame_number - int(HOT_BELLOW * self.FPS)
+        hot_upper = current_frame_number + int(HOT_ABOVE * self.FPS)
+        loop_wrap_range = self.loop_wrap_range() or (0, 0)
+        # `clear_frames_cache` and `use_item` can replace the dicts while
+        #   we are working so only use the ones that we started with
+        frames = self.frames
+        warm_frames = self.warm_frames
+        # So that duplicate frames still share the `CompressedFrame`
+        compressed_frames = {}
+        demoted = []
+        for frame_number in tuple(frames.keys()):
+            if not (lower < self.frame_number_shown < upper):
+                break
+            pinned = self.is_pinned(frame_number)
+            if (not pinned) and (not (lower < frame_number < upper)):
+                frames.pop(frame_number, None)
+            elif self.use_warm_cache and \
+                 (not (hot_lower < frame_number < hot_upper)) and \
+                 (not (loop_wrap_range[0] <= frame_number < \
+                       loop_wrap_range[1])):
+                # Demote the frame to the warm tier (even if it's pinned)
+                image = frames.pop(frame_number, None)
+                if image is None:
+                    continue
+                compressed = warm_frames.get(frame_number, None)
+                if compressed is None:
+                    compressed = compressed_frames.get(id(image), None)
+                if compressed is None:
+                    with tracer.span("compress"):
+                        compressed = CompressedFrame(image)
+                    compressed_frames[id(image)] = compressed
+                warm_frames[frame_number] = compressed
+                demoted.append(compressed)
+        # Drop the decompressed images that no hot frame uses anymore
+        hot_images = set(map(id, tuple(frames.values())))
+        for compressed in demoted:
+            if id(compressed.image) not in hot_images:
+                compressed.image = None
+        for frame_number in tuple(warm_frames.keys()):
             if not (lower < self.frame_number_shown < upper):
                 break
+            if self.is_pinned(frame_number):
+                continue
             if not (lower < frame_number < upper):
-                del self.frames[frame_number]
-        time.sleep(2)
+                warm_frames.pop(frame_number, None)
+        if DEDUP_FRAMES and DEBUGGING:
+            self.report_dedup_ratio()
+
+    def report_dedup_ratio(self) -> None:
+        # Promoted frames are in both tiers
+        warm_frames = tuple(self.warm_frames.items())
+        warm_only = [compressed for frame_number, compressed in warm_frames
+                     if frame_number not in self.frames]
+        frames = tuple(self.frames.values()) + tuple(warm_only)
+        if len(frames) == 0:
+            return None
+        unique = len(set(map(id, frames)))
+        stderr.write(f"[Debug]: Dedup ratio {len(frames)/unique:.2f} " \
+                     f"({len(frames)} frames cached, {unique} unique, " \
+                     f"{self.frames_deduplicated} deduplicated so far)\n")
 
     def sleep_load_frames(self, tag:str) -> None:
         for i in range(10):
@@ -518,8 +1357,16 @@ class Player(BasePlayer):
         while self.loading_frames:
             self.changed_frame_shown["main"] = False
             orig = self.frame_number_shown - 1
-            top = min(self.NUMBER_OF_FRAMES, orig + int(ABOVE * self.FPS))
+            top = orig + int(self.cache_above * self.FPS)
+            top = min(self.NUMBER_OF_FRAMES, top)
+            loop_region = self.current_loop()
+            if loop_region is not None:
+                # Only the A-B loop will be shown
+                top = min(top, loop_region[1] + 1)
             self._load_frames(orig, top)
+            if loop_region is not None:
+                # Fill the start of the loop that will be shown next
+                self._load_frames(loop_region[0], orig)
             if (not self.changed_frame_shown["main"]) and ALLOWED_SLEEP:
                 self.sleep_load_frames("main")
 
@@ -528,34 +1375,95 @@ class Player(BasePlayer):
             if (self.changed_frame_shown["main"]) or (not self.loading_frames):
                 stderr.write("[Debug]: Stop loading frames\n")
                 return None
-            if i not in self.frames:
+            if not self.in_cache(i):
                 try:
                     self.load_frame(i)
                 except cv2.error:
                     pass
 
     def load_frame(self, frame_number) -> None:
-        if self.last_frame_loaded + 1 != frame_number:
-            stderr.write(f"[Debug]: ({self.last_frame_loaded} => " \
-                         f"{frame_number})\n")
-            super().goto_frame_number(frame_number)
-        self.last_frame_loaded = frame_number
+        # `play_next_item` can't release `self.cap` while we are using it
+        with self.cap_lock:
+            sequential = (self.last_frame_loaded + 1 == frame_number)
+            if not sequential:
+                stderr.write(f"[Debug]: ({self.last_frame_loaded} => " \
+                             f"{frame_number})\n")
+                super().goto_frame_number(frame_number)
+            self.last_frame_loaded = frame_number
+
+            if not self.loading_frames:
+                return None
 
-        if not self.loading_frames:
-            return None
+            image_matrix = super().read_next_matrix()
+            for tier in (self.frames, self.warm_frames):
+                previous = tier.get(frame_number - 1, None)
+                if DEDUP_FRAMES and sequential and (previous is not None):
+                    if self.is_duplicate(image_matrix):
+                        # Share the previous frame's image
+                        tier[frame_number] = previous
+                        self.frames_deduplicated += 1
+                        return None
+
+            # This frame owns a new image that the next frames can share
+            self.dedup_thumbnail = self.last_thumbnail
+            if DEDUP_FRAMES and DEDUP_EXACT:
+                self.dedup_matrix = image_matrix
+            image = super().matrix_to_image(image_matrix, self.crop_box)
+            image = super()._resize(image)
+            hot_upper = self.frame_number_shown + int(HOT_ABOVE * self.FPS)
+            if not PHOTOIMAGE_IN_MAIN:
+                self.frames[frame_number] = self.convert_image_to_tk(image)
+            elif self.use_warm_cache and (frame_number > hot_upper):
+                with tracer.span("compress"):
+                    compressed = CompressedFrame(image)
+                self.warm_frames[frame_number] = compressed
+            else:
+                self.frames[frame_number] = image
 
-        image = super()._resize(super().read_next_frame())
-        if not PHOTOIMAGE_IN_MAIN:
-            self.frames[frame_number] = self.convert_image_to_tk(image)
-        else:
-            self.frames[frame_number] = image
+    def clear_dedup(self) -> None:
+        """
+        Forgets the frame that owns the shared image so that the next frame
+        is never shared with a frame from another file/cache.
+        """
+        self.dedup_thumbnail = None
+        self.dedup_matrix = None
+
+    def is_duplicate(self, image_matrix) -> bool:
+        """
+        Checks if the frame that was just read looks the same as the frame
+        that owns the image that is being shared. Comparing with the owner
+        (instead of the previous frame) stops slow fades from freezing.
+        """
+        if (image_matrix is None) or (self.dedup_thumbnail is None) or \
+           (self.last_thumbnail is None) or \
+           (self.last_thumbnail.shape != self.dedup_thumbnail.shape):
+            return False
+        difference = np.abs(self.last_thumbnail - self.dedup_thumbnail)
+        if difference.max() > DEDUP_THRESHOLD:
+            return False
+        if DEDUP_EXACT:
+            # Only the frames that look the same are compared in full
+            return np.array_equal(image_matrix, self.dedup_matrix)
+        return True
 
     def convert_image_to_tk(self, image:Image.Image) -> ImageTk.PhotoImage:
         image.draft("RGB", image.size)
-        return ImageTk.PhotoImage(image)
+        with tracer.span("convert"):
+            return ImageTk.PhotoImage(image)
+
+    def dump_trace(self, event:tk.Event=None) -> None:
+        if not TRACING:
+            return None
+        tracer.dump(TRACE_FILE)
+        stderr.write(f"[Debug]: Saved the trace to \"{TRACE_FILE}\"\n")
 
     def destroy(self) -> None:
         self.loading_frames = False
+        self.dump_trace()
+        self.stop_pipeline()
+        if self.next_item is not None:
+            self.next_item.cap.release()
+            self.next_item = None
         super().stop_sound()
         super().close_sounddir()
         super().destroy()
@@ -571,11 +1479,12 @@ if __name__ == "__main__":
         root.fullscreen_button.invoke()
 
     def default_size(event:tk.Event=None) -> None:
-        player.resize(width=player.BASE_WIDTH)
+        player.resize(width=player.content_width)
         assert not player.resized, "Internal error"
         root.geometry("")
 
     def resized(new_geometry:str) -> None:
+        # Called once the user stops resizing the window
         # If window is resized:
         if "x" in new_geometry:
             player.canvas.update()
@@ -584,7 +1493,7 @@ if __name__ == "__main__":
             player.resize(width=int(width), height=int(height))
 
     root = BetterTk()
-    root.geometry_bindings.append(resized)
+    root.geometry_settled_bindings.append(resized)
     root.title("Video Player")
     root.bind_all("<KeyPress-f>", fullscreen)
     root.bind_all("<KeyPress-g>", default_size)
@@ -593,14 +1502,17 @@ if __name__ == "__main__":
     player.pack(fill="both", expand=True)
 
     if DEBUGGING:
-        filepath = "tmp/vid.ts"
+        filepaths = ("tmp/vid.ts", )
     else:
         filetypes = (("Video File", "*.ts;*.mp4"), ("All files", "*.*"))
-        filepath = askopenfilename(initialdir=r"D:\videos\pokemon\videos",
-                                   filetypes=filetypes, defaultextension="*.*",
-                                   title="Select video file")
-    if filepath != "":
-        player.set_up(filepath)
+        filepaths = askopenfilename(initialdir=r"D:\videos\pokemon\videos",
+                                    filetypes=filetypes, multiple=True,
+                                    defaultextension="*.*",
+                                    title="Select video files")
+    if len(filepaths) > 0:
+        player.set_up(filepaths[0])
+        for filepath in filepaths[1:]:
+            player.queue(filepath)
         player.resize(width=1280)
         time.sleep(0.2) # Just to allow some of the frames to be read.
         player.start()
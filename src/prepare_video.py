@@ -1,7 +1,10 @@
 from tkinter.filedialog import askopenfilename
 from threading import Thread
 import tkinter as tk
+import tempfile
+import random
 import time
+import cv2
 import os
 
 from libraries.bettertk import BetterTk
@@ -11,6 +14,20 @@ from libraries.terminal import Terminal
 WIDGET_KWARGS = dict(bg="black", fg="white")
 THREADS = 10
 
+# The intermediate formats that the player can read. Each profile is:
+#     name: (ffmpeg video arguments, video file extension)
+# The sound is always saved separately as `tmp/<name>_sound.mp3` and the
+# video (if there is one) as `tmp/<name>_video<extension>`
+PROFILES = {"mpeg1-intra": ("-vcodec mpeg1video -intra -q:v 3", ".ts"),
+            "mjpeg-intra": ("-vcodec mjpeg -q:v 3", ".avi"),
+            "short-gop": ("-vcodec libx264 -preset veryfast -crf 20 -g 12 " \
+                          "-bf 0", ".mkv"),
+            "audio-only": (None, None)}
+DEFAULT_PROFILE = "mpeg1-intra"
+
+MEASURE_FRAMES = 300 # Number of frames decoded to measure the decode fps
+MEASURE_SEEKS = 20   # Number of random seeks to measure the seek latency
+
 
 class App:
     def __init__(self):
@@ -31,12 +48,15 @@ class App:
         prepare_files = tk.Button(self.root, text="Prepare files", command=self.prepare_files, **WIDGET_KWARGS)
         prepare_files.pack(fill="x")
 
-        self.var = tk.BooleanVar(self.root)
-        check_button = tk.Checkbutton(root, text="Video", variable=self.var,
-                                      relief="flat", activebackground="black",
-                                      activeforeground="white",
-                                      electcolor="black", **WIDGET_KWARGS)
-        # check_button.pack()
+        self.profile = tk.StringVar(self.root, value=DEFAULT_PROFILE)
+        profile_menu = tk.OptionMenu(self.root, self.profile, *PROFILES)
+        profile_menu.config(relief="flat", highlightthickness=0,
+                            activebackground="black",
+                            activeforeground="white", **WIDGET_KWARGS)
+        profile_menu.pack(fill="x")
+
+        measure_button = tk.Button(self.root, text="Measure profiles", command=self.measure_profiles, **WIDGET_KWARGS)
+        measure_button.pack(fill="x")
 
         clear_button = tk.Button(self.root, text="Clear", command=self.clear_terminal, **WIDGET_KWARGS)
         clear_button.pack(fill="x")
@@ -81,18 +101,21 @@ class App:
             self.terminal.write("[Debug]: Stopping\n", tag="error")
         if len(self.selected_files) > 0:
             self.file = self.selected_files.pop(0)
-            soundfile = self.file.replace("\\", "/").split("/")[-1]
-            soundfile = f"tmp/{soundfile}_sound.mp3"
+            name = self.file.replace("\\", "/").split("/")[-1]
+            soundfile = f"tmp/{name}_sound.mp3"
 
             file_pretty_print = self.file.replace("/", "\\")
             soundfile_pretty_print = soundfile.replace("/", "\\")
             self.terminal.write(f"Preparing: {file_pretty_print} => " \
-                                f"{soundfile_pretty_print}\n", tag="error")
+                                f"{soundfile_pretty_print} " \
+                                f"({self.profile.get()})\n", tag="error")
 
-            pipe = self.terminal.stdout[1]
-            command = f"ffmpeg -y -v 2 -stats -threads {THREADS} " \
-                      f"-i {self.file} -vcodec mpeg1video -acodec " \
-                      f"libmp3lame -intra {soundfile}"
+            video_args, extension = PROFILES[self.profile.get()]
+            videofile = None
+            if video_args is not None:
+                videofile = f"tmp/{name}_video{extension}"
+            command = self.get_command(self.file, soundfile, video_args,
+                                       videofile)
 
             #width = 1826
             #command = f"ffmpeg -y -v 2 -stats -threads {THREADS} -i " \
@@ -105,6 +128,107 @@ class App:
             self.terminal.write("[Debug]: Done\n", tag="error")
             self.preparing = False
 
+    def get_command(self, file:str, soundfile:str, video_args:str,
+                    videofile:str) -> str:
+        """
+        Returns the ffmpeg command that writes the sound of `file` into
+        `soundfile` (if it isn't `None`) and the video stream into
+        `videofile` (if it isn't `None`) using `video_args`.
+        """
+        command = f"ffmpeg -y -v 2 -stats -threads {THREADS} -i {file}"
+        if soundfile is not None:
+            command += f" -vn -acodec libmp3lame {soundfile}"
+        if videofile is not None:
+            command += f" -an {video_args} {videofile}"
+        return command
+
+    def measure_profiles(self) -> None:
+        """
+        Transcodes the first selected file with every profile that has a
+        video stream and reports the file size, the decode fps and the
+        random seek latency of each one.
+        """
+        if self.preparing or (len(self.selected_files) == 0):
+            return None
+        self.preparing = True
+        self.measure_dir = tempfile.TemporaryDirectory()
+        self.measure_file = self.selected_files[0]
+        self.measure_queue = [name for name, (video_args, _) in
+                              PROFILES.items() if video_args is not None]
+        self.terminal.write(f"Measuring: {self.measure_file}\n", tag="error")
+        self._measure_next_profile()
+
+    def _measure_next_profile(self) -> None:
+        if (not self.preparing) or (len(self.measure_queue) == 0):
+            self.terminal.write("[Debug]: Done measuring\n", tag="error")
+            self.measure_dir.cleanup()
+            self.preparing = False
+            return None
+        name = self.measure_queue.pop(0)
+        video_args, extension = PROFILES[name]
+        videofile = f"{self.measure_dir.name}/{name}_video{extension}"
+        # The sound is the same for all profiles so don't bother with it
+        command = self.get_command(self.measure_file, None, video_args,
+                                   videofile)
+        self.terminal.run(command, self._measure_profile, name, videofile)
+
+    def _measure_profile(self, name:str, videofile:str) -> None:
+        if (self.terminal.poll() != 0) or (not os.path.isfile(videofile)):
+            self.terminal.write(f"{name}: couldn't transcode\n", tag="error")
+            self._measure_next_profile()
+            return None
+        # The thread puts its result in here
+        result = []
+        thread = Thread(target=lambda: result.append(self.measure_video(
+                                                     name, videofile)),
+                        daemon=True)
+        thread.start()
+        self._wait_for_thread(thread, result)
+
+    def _wait_for_thread(self, thread:Thread, result:list) -> None:
+        if thread.is_alive():
+            self.root.after(100, self._wait_for_thread, thread, result)
+            return None
+        # Tkinter must only be used from this thread
+        if len(result) == 0:
+            self.terminal.write("Couldn't measure\n", tag="error")
+        else:
+            self.terminal.write(result[0], tag="error")
+        self._measure_next_profile()
+
+    def measure_video(self, name:str, videofile:str) -> str:
+        """
+        Returns the file size, the decode fps and the random seek latency
+        of `videofile` as a line of text. It doesn't touch tkinter so it
+        can run in another thread.
+        """
+        size = os.path.getsize(videofile) / 1024 / 1024
+
+        cap = cv2.VideoCapture(videofile)
+        number_of_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        frames_read = 0
+        start = time.perf_counter()
+        while frames_read < MEASURE_FRAMES:
+            success, _ = cap.read()
+            if not success:
+                break
+            frames_read += 1
+        decode_fps = frames_read / (time.perf_counter() - start)
+
+        seek_times = []
+        for i in range(MEASURE_SEEKS):
+            frame_number = random.randrange(max(1, number_of_frames))
+            start = time.perf_counter()
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            cap.read()
+            seek_times.append(time.perf_counter() - start)
+        seek_latency = sum(seek_times) / len(seek_times) * 1000
+        cap.release()
+
+        return f"{name}: {size:.1f} MiB, {decode_fps:.1f} decode fps, " \
+               f"{seek_latency:.1f} ms per seek\n"
+
     def get_video_files(self) -> tuple:
         filetypes = (("Video File", "*.ts;*.mp4"), ("All files", "*.*"))
         filepath = askopenfilename(initialdir=r"D:\videos\pokemon\videos",
@@ -113,19 +237,23 @@ class App:
         return filepath
 
     def clear_cache(self) -> None:
-        self.delete_mp3s("tmp/")
+        self.delete_prepared_files("tmp/")
 
     def mainloop(self) -> None:
         self.root.mainloop()
 
-    def delete_mp3s(self, folder:str) -> None:
+    def delete_prepared_files(self, folder:str) -> None:
         """
-        Delete all `.mp3` files from `folder` and all of its subdirs
+        Delete all of the sound and video files that we made from `folder`
         """
+        endings = ["_sound.mp3"]
+        for _, extension in PROFILES.values():
+            if extension is not None:
+                endings.append(f"_video{extension}")
         for file in os.listdir(folder):
-            if file == "vid.ts_sound.mp3":
+            if file.startswith("vid.ts_"):
                 continue
-            if file[-10:] == "_sound.mp3":
+            if file.endswith(tuple(endings)):
                 file_path = os.path.join(folder, file)
                 file_path_pprint = file_path.replace("/", "\\")
                 self.terminal.write(f"[Debug]: Deleting {file_path_pprint}\n",